@@ -0,0 +1,42 @@
+"""Short-lived result caching for expensive read endpoints."""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+
+class AsyncTTLCache:
+    """
+    Caches the result of an async computation for `ttl` seconds.
+    
+    Concurrent callers that miss the cache share one in-flight computation
+    (single-flight) instead of each running it.
+    """
+    
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._value: Any = None
+        self._expires_at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+    
+    async def get(self, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value, computing it if expired."""
+        if self._expires_at > time.monotonic():
+            return self._value
+        if self._inflight is None:
+            self._inflight = asyncio.create_task(self._refresh(compute))
+        # Shield so a cancelled caller does not cancel the shared computation
+        return await asyncio.shield(self._inflight)
+    
+    def clear(self):
+        """Drop the cached value."""
+        self._value = None
+        self._expires_at = 0.0
+    
+    async def _refresh(self, compute: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await compute()
+            self._value = value
+            self._expires_at = time.monotonic() + self.ttl
+            return value
+        finally:
+            self._inflight = None
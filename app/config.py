@@ -9,11 +9,15 @@ class Config:
     DATABASE_URL: str
     WEBHOOK_SECRET: str
     LOG_LEVEL: str
+    ENABLE_BATCH_WEBHOOK: bool
     
     def __init__(self):
         self.DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:////data/app.db")
         self.WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
         self.LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+        self.ENABLE_BATCH_WEBHOOK = os.getenv(
+            "ENABLE_BATCH_WEBHOOK", "false"
+        ).lower() in ("1", "true", "yes")
     
     def validate(self) -> Optional[str]:
         """Validate required configuration. Returns error message if invalid."""
@@ -1,56 +1,85 @@
 """Structured JSON logging utilities."""
-import json
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
 import sys
-from datetime import datetime
-from typing import Any, Dict
-import uuid
+import time
+from typing import Any, Dict, Optional
 from contextvars import ContextVar
 
+import orjson
+
 
 # Context variable to store request_id across async calls
 request_id_var: ContextVar[str] = ContextVar("request_id", default="")
 
+# Background listener that writes queued log records to stdout
+_listener: Optional[logging.handlers.QueueListener] = None
+
+# Random bytes for request IDs, refilled in batches to amortize os.urandom calls
+_REQUEST_ID_BYTES = 16
+_REQUEST_ID_BATCH = 1024
+_id_buf = b""
+_id_pos = 0
+
+
+def utc_iso(timestamp: Optional[float] = None) -> str:
+    """Format a Unix timestamp (default: now) as ISO-8601 UTC with Z suffix."""
+    t = time.gmtime(timestamp)
+    return (
+        f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d}"
+        f"T{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}Z"
+    )
+
 
 class JSONFormatter(logging.Formatter):
     """Custom formatter that outputs JSON logs."""
     
+    # Extra fields copied onto the log line when present on the record
+    EXTRA_FIELDS = (
+        "request_id", "method", "path", "status",
+        "latency_ms", "message_id", "dup", "result"
+    )
+    
     def format(self, record: logging.LogRecord) -> str:
         log_data: Dict[str, Any] = {
-            "ts": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "ts": utc_iso(record.created),
             "level": record.levelname,
             "message": record.getMessage()
         }
         
         # Add extra fields if present
-        if hasattr(record, "request_id"):
-            log_data["request_id"] = record.request_id
-        if hasattr(record, "method"):
-            log_data["method"] = record.method
-        if hasattr(record, "path"):
-            log_data["path"] = record.path
-        if hasattr(record, "status"):
-            log_data["status"] = record.status
-        if hasattr(record, "latency_ms"):
-            log_data["latency_ms"] = record.latency_ms
-        if hasattr(record, "message_id"):
-            log_data["message_id"] = record.message_id
-        if hasattr(record, "dup"):
-            log_data["dup"] = record.dup
-        if hasattr(record, "result"):
-            log_data["result"] = record.result
+        attrs = record.__dict__
+        for key in self.EXTRA_FIELDS:
+            if key in attrs:
+                log_data[key] = attrs[key]
         
-        return json.dumps(log_data)
+        return orjson.dumps(log_data).decode()
 
 
 def setup_logging(log_level: str = "INFO"):
-    """Configure structured JSON logging."""
+    """
+    Configure structured JSON logging.
+    
+    Request-path code only enqueues records; a listener thread formats them
+    and writes to stdout, so a slow stdout pipe never blocks the event loop.
+    """
+    global _listener
+    
     handler = logging.StreamHandler(sys.stdout)
     handler.setFormatter(JSONFormatter())
     
+    if _listener is not None:
+        _listener.stop()
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, handler)
+    _listener.start()
+    
     root_logger = logging.getLogger()
     root_logger.handlers.clear()
-    root_logger.addHandler(handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
     root_logger.setLevel(log_level)
     
     # Suppress uvicorn access logs (we handle them ourselves)
@@ -58,9 +87,40 @@ def setup_logging(log_level: str = "INFO"):
     logging.getLogger("uvicorn.access").propagate = False
 
 
+def shutdown_logging():
+    """Flush queued log records and stop the listener thread."""
+    global _listener
+    
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
 def generate_request_id() -> str:
-    """Generate a unique request ID."""
-    return str(uuid.uuid4())
+    """Generate a unique request ID (32 hex chars)."""
+    global _id_buf, _id_pos
+    
+    if _id_pos >= len(_id_buf):
+        _id_buf = os.urandom(_REQUEST_ID_BYTES * _REQUEST_ID_BATCH)
+        _id_pos = 0
+    start = _id_pos
+    _id_pos += _REQUEST_ID_BYTES
+    return _id_buf[start:_id_pos].hex()
+
+
+def _reset_request_id_buffer():
+    """Drop buffered randomness so forked workers never share request IDs."""
+    global _id_buf, _id_pos
+    _id_buf = b""
+    _id_pos = 0
+
+
+# Fork hooks only exist on Unix; Windows workers are spawned, not forked
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_request_id_buffer)
 
 
 def set_request_id(request_id: str):
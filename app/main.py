@@ -1,19 +1,23 @@
 """FastAPI application main entry point."""
-import hmac
 import hashlib
+import hmac
 import logging
+import asyncio
+import ssl
 import time
-from typing import Optional
+from typing import List, Optional
+import orjson
 from fastapi import FastAPI, Request, Response, HTTPException, Query
-from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from pydantic import TypeAdapter, ValidationError
 from contextlib import asynccontextmanager
 
 from app.config import config
 from app.models import (
-    WebhookRequest, WebhookResponse, MessagesResponse,
-    StatsResponse, MessageOut
+    WebhookRequest, WebhookResponse, MessagesResponse, StatsResponse
 )
-from app.storage import Storage
+from app.storage import Storage, encode_cursor, decode_cursor
 from app.logging_utils import (
     setup_logging, generate_request_id, set_request_id, get_request_id
 )
@@ -27,26 +31,42 @@ logger = logging.getLogger(__name__)
 # Initialize storage
 storage = Storage(config.DATABASE_URL)
 
+# Encoded webhook secret, set once at startup
+_SECRET_BYTES = b""
+
+# Validator for /webhook/batch bodies (a JSON list of webhook payloads)
+_BATCH_ADAPTER = TypeAdapter(List[WebhookRequest])
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager."""
+    global _SECRET_BYTES
+    
     # Startup
     validation_error = config.validate()
     if validation_error:
         logger.error(validation_error)
         raise RuntimeError(validation_error)
+    _SECRET_BYTES = config.WEBHOOK_SECRET.encode()
     
+    await storage.connect()
     await storage.init_db()
+    # "_hashlib" means SHA-256 is served by OpenSSL (SHA-NI when the CPU has it)
+    logger.info(
+        f"Crypto backend: openssl={ssl.OPENSSL_VERSION} "
+        f"sha256_impl={hashlib.sha256.__module__}"
+    )
     logger.info("Application started")
     
     yield
     
     # Shutdown
     logger.info("Application shutting down")
+    await storage.close()
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 
 @app.middleware("http")
@@ -55,53 +75,48 @@ async def logging_middleware(request: Request, call_next):
     request_id = generate_request_id()
     set_request_id(request_id)
     
-    start_time = time.time()
+    start_time = time.perf_counter()
     
     # Process request
     response = await call_next(request)
     
     # Calculate latency
-    latency_ms = round((time.time() - start_time) * 1000, 2)
+    latency_ms = round((time.perf_counter() - start_time) * 1000, 2)
     
     # Record metrics
-    metrics.record_http_request(request.url.path, response.status_code)
+    path = request.url.path
+    metrics.record_http_request(path, response.status_code)
     metrics.record_latency(latency_ms)
     
-    # Log request
-    log_extra = {
-        "request_id": request_id,
-        "method": request.method,
-        "path": request.url.path,
-        "status": response.status_code,
-        "latency_ms": latency_ms
-    }
-    
-    logger.info(
-        f"{request.method} {request.url.path} {response.status_code}",
-        extra=log_extra
-    )
+    # Log request (skip building the record when INFO is disabled)
+    if logger.isEnabledFor(logging.INFO):
+        log_extra = {
+            "request_id": request_id,
+            "method": request.method,
+            "path": path,
+            "status": response.status_code,
+            "latency_ms": latency_ms
+        }
+        
+        logger.info(
+            f"{request.method} {path} {response.status_code}",
+            extra=log_extra
+        )
     
     return response
 
 
 def verify_signature(body: bytes, signature: str) -> bool:
     """Verify HMAC-SHA256 signature using constant-time comparison."""
-    expected = hmac.new(
-        config.WEBHOOK_SECRET.encode(),
-        body,
-        hashlib.sha256
-    ).hexdigest()
-    
+    if not _SECRET_BYTES:
+        # Startup has not run; never accept signatures made with an empty key
+        return False
+    expected = hmac.digest(_SECRET_BYTES, body, "sha256").hex()
     return hmac.compare_digest(expected, signature)
 
 
-@app.post("/webhook", response_model=WebhookResponse)
-async def webhook(request: Request):
-    """Ingest inbound WhatsApp-like messages."""
-    # Read raw body
-    body = await request.body()
-    
-    # Verify signature
+def require_signature(request: Request, body: bytes):
+    """Reject the request with 401 unless X-Signature matches the body."""
     signature = request.headers.get("X-Signature", "")
     if not verify_signature(body, signature):
         log_extra = {
@@ -111,18 +126,40 @@ async def webhook(request: Request):
         logger.error("Invalid signature", extra=log_extra)
         metrics.record_webhook_request("invalid_signature")
         raise HTTPException(status_code=401, detail="invalid signature")
-    
-    # Parse and validate payload
+
+
+def parse_body(body: bytes, validator):
+    """Parse JSON body with a pydantic validator, raising 422 on failure."""
     try:
-        payload = WebhookRequest.model_validate_json(body)
-    except Exception as e:
+        return validator(orjson.loads(body))
+    except (orjson.JSONDecodeError, ValidationError) as e:
         log_extra = {
             "request_id": get_request_id(),
             "result": "validation_error"
         }
         logger.error(f"Validation error: {str(e)}", extra=log_extra)
         metrics.record_webhook_request("validation_error")
-        raise
+        if isinstance(e, ValidationError):
+            errors = [
+                {**err, "loc": ("body", *err["loc"])}
+                for err in e.errors(include_url=False)
+            ]
+        else:
+            errors = [{"type": "json_invalid", "loc": ("body",), "msg": str(e)}]
+        raise RequestValidationError(errors)
+
+
+@app.post("/webhook", response_model=WebhookResponse)
+async def webhook(request: Request):
+    """Ingest inbound WhatsApp-like messages."""
+    # Read raw body
+    body = await request.body()
+    
+    # Verify signature
+    require_signature(request, body)
+    
+    # Parse and validate payload
+    payload = parse_body(body, WebhookRequest.model_validate)
     
     # Insert into database
     success, is_duplicate = await storage.insert_message(
@@ -144,39 +181,100 @@ async def webhook(request: Request):
     logger.info(f"Webhook processed: {result}", extra=log_extra)
     metrics.record_webhook_request(result)
     
-    return WebhookResponse(status="ok")
+    return {"status": "ok"}
+
+
+if config.ENABLE_BATCH_WEBHOOK:
+    @app.post("/webhook/batch", response_model=WebhookResponse)
+    async def webhook_batch(request: Request):
+        """
+        Ingest a JSON list of messages signed as one body.
+        
+        The list is validated as a whole (any invalid item rejects the batch),
+        and the rows reach the storage writer together, so they are normally
+        committed in a single transaction.
+        """
+        body = await request.body()
+        require_signature(request, body)
+        payloads = parse_body(body, _BATCH_ADAPTER.validate_python)
+        
+        results = await asyncio.gather(*(
+            storage.insert_message(
+                message_id=payload.message_id,
+                from_msisdn=payload.from_,
+                to_msisdn=payload.to,
+                ts=payload.ts,
+                text=payload.text
+            )
+            for payload in payloads
+        ))
+        
+        duplicates = 0
+        for _, is_duplicate in results:
+            duplicates += is_duplicate
+            metrics.record_webhook_request("duplicate" if is_duplicate else "created")
+        log_extra = {
+            "request_id": get_request_id(),
+            "result": "batch"
+        }
+        logger.info(
+            f"Webhook batch processed: {len(results) - duplicates} created, "
+            f"{duplicates} duplicate",
+            extra=log_extra
+        )
+        
+        return {"status": "ok"}
 
 
-@app.get("/messages", response_model=MessagesResponse)
+# Rows from storage already have the MessagesResponse shape; the model is only
+# declared for the OpenAPI schema so the response is not re-validated
+@app.get("/messages", responses={200: {"model": MessagesResponse}})
 async def get_messages(
     limit: int = Query(default=50, ge=1, le=100),
     offset: int = Query(default=0, ge=0),
     from_: Optional[str] = Query(default=None, alias="from"),
     since: Optional[str] = Query(default=None),
-    q: Optional[str] = Query(default=None)
+    q: Optional[str] = Query(default=None),
+    cursor: Optional[str] = Query(default=None),
+    include_total: bool = Query(default=True)
 ):
     """Get paginated and filtered messages."""
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=422, detail="invalid cursor")
+    
     messages, total = await storage.get_messages(
         limit=limit,
         offset=offset,
         from_filter=from_,
         since=since,
-        q=q
+        q=q,
+        after=after,
+        include_total=include_total
     )
     
-    return MessagesResponse(
-        data=[MessageOut(**msg) for msg in messages],
-        total=total,
-        limit=limit,
-        offset=offset
-    )
+    # A full page may have more rows after it
+    next_cursor = None
+    if len(messages) == limit:
+        last = messages[-1]
+        next_cursor = encode_cursor(last["ts"], last["message_id"])
+    
+    return {
+        "data": messages,
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "next_cursor": next_cursor
+    }
 
 
 @app.get("/stats", response_model=StatsResponse)
 async def get_stats():
     """Get message statistics."""
-    stats = await storage.get_stats()
-    return StatsResponse(**stats)
+    return await storage.get_stats()
 
 
 @app.get("/health/live")
@@ -188,16 +286,16 @@ async def health_live():
 @app.get("/health/ready")
 async def health_ready():
     """Readiness probe - returns 200 only when fully ready."""
-    # Check WEBHOOK_SECRET
-    if not config.WEBHOOK_SECRET:
-        return JSONResponse(
+    # Check WEBHOOK_SECRET (encoded once at startup)
+    if not _SECRET_BYTES:
+        return ORJSONResponse(
             status_code=503,
             content={"status": "not ready", "reason": "WEBHOOK_SECRET not set"}
         )
     
     # Check database
     if not await storage.is_ready():
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=503,
             content={"status": "not ready", "reason": "database not ready"}
         )
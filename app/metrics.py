@@ -1,73 +1,130 @@
 """Prometheus metrics collection."""
 from collections import defaultdict
 from typing import Dict, List
-import threading
+import bisect
+import time
+
+
+# Upper bounds (ms) of the request latency histogram buckets; +Inf is implicit
+LATENCY_BUCKETS_MS: List[float] = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+# How long a rendered /metrics payload may be reused
+EXPORT_CACHE_TTL_SECONDS = 1.0
+
+# Status codes this service returns, each with a fixed counter slot per path
+HTTP_STATUSES = (200, 401, 404, 405, 422, 500, 503)
+_STATUS_SLOT: Dict[int, int] = {status: i for i, status in enumerate(HTTP_STATUSES)}
+
+# Static parts of the exposition output, encoded once
+_HTTP_REQUESTS_HEADER = (
+    b"# HELP http_requests_total Total HTTP requests by path and status\n"
+    b"# TYPE http_requests_total counter\n"
+)
+_WEBHOOK_REQUESTS_HEADER = (
+    b"# HELP webhook_requests_total Total webhook requests by result\n"
+    b"# TYPE webhook_requests_total counter\n"
+)
+_LATENCY_HEADER = (
+    b"# HELP request_latency_ms Request latency in milliseconds\n"
+    b"# TYPE request_latency_ms histogram\n"
+)
+_LATENCY_BUCKET_PREFIXES: List[bytes] = [
+    f'request_latency_ms_bucket{{le="{bound}"}} '.encode()
+    for bound in [*LATENCY_BUCKETS_MS, "+Inf"]
+]
 
 
 class MetricsCollector:
-    """Thread-safe metrics collector for Prometheus exposition."""
+    """
+    In-process metrics collector for Prometheus exposition.
+    
+    Only touched from async handlers on the event loop thread, so no locking
+    is needed. Counters are per process: with multiple uvicorn workers each
+    worker reports its own values (use prometheus_client's multiprocess mode
+    if aggregated metrics are required).
+    """
     
     def __init__(self):
-        self._lock = threading.Lock()
-        self._http_requests: Dict[tuple, int] = defaultdict(int)
+        # path -> one counter per HTTP_STATUSES slot; other statuses go to
+        # the (path, status)-keyed overflow dict
+        self._http_requests: Dict[str, List[int]] = {}
+        self._http_requests_other: Dict[tuple, int] = defaultdict(int)
         self._webhook_requests: Dict[str, int] = defaultdict(int)
-        self._request_latencies: List[float] = []
+        self._latency_bucket_counts: List[int] = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self._latency_count = 0
+        self._latency_sum = 0.0
+        self._export_cache = b""
+        self._export_expires_at = 0.0
     
     def record_http_request(self, path: str, status: int):
         """Record HTTP request by path and status."""
-        with self._lock:
-            self._http_requests[(path, status)] += 1
+        slot = _STATUS_SLOT.get(status)
+        if slot is None:
+            self._http_requests_other[(path, status)] += 1
+            return
+        counts = self._http_requests.get(path)
+        if counts is None:
+            counts = self._http_requests[path] = [0] * len(HTTP_STATUSES)
+        counts[slot] += 1
     
     def record_webhook_request(self, result: str):
         """Record webhook request outcome."""
-        with self._lock:
-            self._webhook_requests[result] += 1
+        self._webhook_requests[result] += 1
     
     def record_latency(self, latency_ms: float):
         """Record request latency in milliseconds."""
-        with self._lock:
-            self._request_latencies.append(latency_ms)
+        idx = bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)
+        self._latency_bucket_counts[idx] += 1
+        self._latency_count += 1
+        self._latency_sum += latency_ms
+    
+    def export_metrics(self) -> bytes:
+        """Export metrics in Prometheus text format, cached for EXPORT_CACHE_TTL_SECONDS."""
+        now = time.monotonic()
+        if self._export_expires_at <= now:
+            self._export_cache = self._render()
+            self._export_expires_at = now + EXPORT_CACHE_TTL_SECONDS
+        return self._export_cache
     
-    def export_metrics(self) -> str:
-        """Export metrics in Prometheus text format."""
-        lines = []
+    def _render(self) -> bytes:
+        """Render current metric values as Prometheus text exposition bytes."""
+        parts: List[bytes] = []
+        
+        # HTTP requests total
+        parts.append(_HTTP_REQUESTS_HEADER)
+        http_counts = [
+            ((path, status), count)
+            for path, counts in self._http_requests.items()
+            for status, count in zip(HTTP_STATUSES, counts)
+            if count
+        ]
+        http_counts.extend(self._http_requests_other.items())
+        for (path, status), count in sorted(http_counts):
+            parts.append(
+                b'http_requests_total{path="' + path.encode()
+                + b'",status="' + str(status).encode()
+                + b'"} ' + str(count).encode() + b"\n"
+            )
+        
+        # Webhook requests total
+        parts.append(_WEBHOOK_REQUESTS_HEADER)
+        for result, count in sorted(self._webhook_requests.items()):
+            parts.append(
+                b'webhook_requests_total{result="' + result.encode()
+                + b'"} ' + str(count).encode() + b"\n"
+            )
+        
+        # Request latency (cumulative buckets)
+        parts.append(_LATENCY_HEADER)
+        cumulative = 0
+        for prefix, count in zip(_LATENCY_BUCKET_PREFIXES, self._latency_bucket_counts):
+            cumulative += count
+            parts.append(prefix + str(cumulative).encode() + b"\n")
         
-        with self._lock:
-            # HTTP requests total
-            lines.append("# HELP http_requests_total Total HTTP requests by path and status")
-            lines.append("# TYPE http_requests_total counter")
-            for (path, status), count in sorted(self._http_requests.items()):
-                lines.append(f'http_requests_total{{path="{path}",status="{status}"}} {count}')
-            
-            # Webhook requests total
-            lines.append("# HELP webhook_requests_total Total webhook requests by result")
-            lines.append("# TYPE webhook_requests_total counter")
-            for result, count in sorted(self._webhook_requests.items()):
-                lines.append(f'webhook_requests_total{{result="{result}"}} {count}')
-            
-            # Request latency
-            if self._request_latencies:
-                lines.append("# HELP request_latency_ms Request latency in milliseconds")
-                lines.append("# TYPE request_latency_ms summary")
-                
-                sorted_latencies = sorted(self._request_latencies)
-                count = len(sorted_latencies)
-                total = sum(sorted_latencies)
-                
-                lines.append(f"request_latency_ms_count {count}")
-                lines.append(f"request_latency_ms_sum {total}")
-                
-                # Quantiles
-                if count > 0:
-                    p50_idx = int(count * 0.5)
-                    p90_idx = int(count * 0.9)
-                    p99_idx = int(count * 0.99)
-                    
-                    lines.append(f'request_latency_ms{{quantile="0.5"}} {sorted_latencies[p50_idx]}')
-                    lines.append(f'request_latency_ms{{quantile="0.9"}} {sorted_latencies[p90_idx]}')
-                    lines.append(f'request_latency_ms{{quantile="0.99"}} {sorted_latencies[p99_idx]}')
+        parts.append(b"request_latency_ms_count " + str(self._latency_count).encode() + b"\n")
+        parts.append(b"request_latency_ms_sum " + str(self._latency_sum).encode() + b"\n")
         
-        return "\n".join(lines) + "\n"
+        return b"".join(parts)
 
 
 # Global metrics collector instance
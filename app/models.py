@@ -4,6 +4,10 @@ from typing import Optional, List
 import re
 
 
+_E164_RE = re.compile(r'^\+\d+$')
+_TS_RE = re.compile(r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z$')
+
+
 class WebhookRequest(BaseModel):
     """Inbound webhook message payload."""
     message_id: str = Field(..., min_length=1)
@@ -16,7 +20,7 @@ class WebhookRequest(BaseModel):
     @classmethod
     def validate_e164(cls, v: str) -> str:
         """Validate E.164 format: + followed by digits only."""
-        if not re.match(r'^\+\d+$', v):
+        if not _E164_RE.match(v):
             raise ValueError("must be E.164 format: + followed by digits")
         return v
     
@@ -27,7 +31,7 @@ class WebhookRequest(BaseModel):
         if not v.endswith("Z"):
             raise ValueError("timestamp must be ISO-8601 UTC with Z suffix")
         # Basic format check
-        if not re.match(r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z$', v):
+        if not _TS_RE.match(v):
             raise ValueError("timestamp must be ISO-8601 format: YYYY-MM-DDTHH:MM:SSZ")
         return v
 
@@ -52,9 +56,10 @@ class MessageOut(BaseModel):
 class MessagesResponse(BaseModel):
     """Paginated messages list response."""
     data: List[MessageOut]
-    total: int
+    total: Optional[int]
     limit: int
     offset: int
+    next_cursor: Optional[str] = None
 
 
 class SenderCount(BaseModel):
@@ -1,9 +1,49 @@
 """Database storage layer with async SQLite access."""
+import asyncio
+import base64
+import binascii
+import logging
 import aiosqlite
 from typing import Optional, List, Tuple
-from datetime import datetime
 import os
 
+from app.cache import AsyncTTLCache
+from app.logging_utils import utc_iso
+
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of queued inserts committed in one transaction
+MAX_INSERT_BATCH = 500
+
+# How long /stats results may be served from cache
+STATS_CACHE_TTL_SECONDS = 1.0
+
+
+def encode_cursor(ts: str, message_id: str) -> str:
+    """Encode a (ts, message_id) sort key as an opaque pagination cursor."""
+    return base64.urlsafe_b64encode(f"{ts}|{message_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Decode a pagination cursor. Raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    except (binascii.Error, UnicodeError) as e:
+        raise ValueError("invalid cursor") from e
+    # ts never contains "|", so the first separator splits the key
+    ts, sep, message_id = raw.partition("|")
+    if not sep:
+        raise ValueError("invalid cursor")
+    return (ts, message_id)
+
+
+def _fail_futures(items: List[tuple], error: Exception):
+    """Set error on the futures of (row, future) items that are still pending."""
+    for _, future in items:
+        if not future.done():
+            future.set_exception(error)
+
 
 class Storage:
     """Async SQLite storage for messages."""
@@ -11,15 +51,52 @@ class Storage:
     def __init__(self, database_url: str):
         # Extract path from sqlite:////data/app.db format
         self.db_path = database_url.replace("sqlite:///", "")
-        
-    async def init_db(self):
-        """Initialize database schema."""
+        self._db: Optional[aiosqlite.Connection] = None
+        self._lock = asyncio.Lock()
+        self._insert_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._stats_cache = AsyncTTLCache(STATS_CACHE_TTL_SECONDS)
+    
+    async def connect(self):
+        """Open the long-lived connection shared by all requests."""
         # Ensure directory exists
         db_dir = os.path.dirname(self.db_path)
         if db_dir and not os.path.exists(db_dir):
             os.makedirs(db_dir, exist_ok=True)
         
-        async with aiosqlite.connect(self.db_path) as db:
+        self._db = await aiosqlite.connect(self.db_path)
+        self._db.row_factory = aiosqlite.Row
+        
+        # WAL lets reads proceed during writes; NORMAL sync is crash-safe in WAL
+        await self._db.execute("PRAGMA journal_mode=WAL")
+        await self._db.execute("PRAGMA synchronous=NORMAL")
+        await self._db.execute("PRAGMA temp_store=MEMORY")
+        await self._db.execute("PRAGMA cache_size=-64000")
+        # mmap has no effect on in-memory databases (used by the tests)
+        if self.db_path != ":memory:":
+            await self._db.execute("PRAGMA mmap_size=268435456")
+        
+        self._insert_queue = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._writer_loop())
+    
+    async def close(self):
+        """Flush pending inserts and close the shared connection."""
+        if self._writer_task is not None:
+            if not self._writer_task.done():
+                # Sentinel: the writer drains everything queued before it, then exits
+                await self._insert_queue.put(None)
+                await self._writer_task
+            self._writer_task = None
+            self._insert_queue = None
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+        self._stats_cache.clear()
+        
+    async def init_db(self):
+        """Initialize database schema."""
+        async with self._lock:
+            db = self._db
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS messages (
                     message_id TEXT PRIMARY KEY,
@@ -30,13 +107,68 @@ class Storage:
                     created_at TEXT NOT NULL
                 )
             """)
+            # Serve the ts/message_id ordering and per-sender filters from indexes
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_msgs_ts_id ON messages(ts, message_id)"
+            )
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_msgs_from_ts ON messages(from_msisdn, ts, message_id)"
+            )
+            
+            # Full-text index over text for q= search. The trigram tokenizer
+            # keeps the case-insensitive substring semantics of LIKE '%q%'.
+            # Rows are keyed by message_id: the implicit rowid of a table with
+            # a TEXT primary key is not stable across VACUUM.
+            cursor = await db.execute(
+                "SELECT sql FROM sqlite_master WHERE type='table' AND name='messages_fts'"
+            )
+            fts_row = await cursor.fetchone()
+            if fts_row is not None and "message_id" not in fts_row["sql"]:
+                # Drop the earlier rowid-keyed index (and its triggers) to rebuild it
+                for trigger in ("messages_fts_ai", "messages_fts_ad", "messages_fts_au"):
+                    await db.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+                await db.execute("DROP TABLE messages_fts")
+                fts_row = None
+            await db.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                    message_id UNINDEXED, text, tokenize='trigram'
+                )
+            """)
+            await db.execute("""
+                CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+                    INSERT INTO messages_fts(message_id, text) VALUES (new.message_id, new.text);
+                END
+            """)
+            # FTS5 cannot index the UNINDEXED message_id column, so the delete
+            # and update triggers below scan the whole search index for every
+            # changed row (O(N)). Nothing deletes or updates messages today;
+            # give FTS rows a stable integer key before adding bulk deletes
+            # (e.g. retention).
+            await db.execute("""
+                CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+                    DELETE FROM messages_fts WHERE message_id = old.message_id;
+                END
+            """)
+            await db.execute("""
+                CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE ON messages BEGIN
+                    DELETE FROM messages_fts WHERE message_id = old.message_id;
+                    INSERT INTO messages_fts(message_id, text) VALUES (new.message_id, new.text);
+                END
+            """)
+            if fts_row is None:
+                # Index rows stored before the full-text table existed
+                await db.execute(
+                    "INSERT INTO messages_fts(message_id, text) SELECT message_id, text FROM messages"
+                )
             await db.commit()
     
     async def is_ready(self) -> bool:
-        """Check if database is reachable and schema exists."""
+        """Check if database is reachable, schema exists and the writer is running."""
+        if self._db is None or not self._writer_running():
+            return False
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                cursor = await db.execute(
+            async with self._lock:
+                cursor = await self._db.execute(
                     "SELECT name FROM sqlite_master WHERE type='table' AND name='messages'"
                 )
                 result = await cursor.fetchone()
@@ -55,27 +187,88 @@ class Storage:
         """
         Insert message into database.
         
+        The row is handed to the background writer, which commits queued
+        inserts in batches; this waits until the row's batch is committed.
+        
         Returns:
             (success, is_duplicate) tuple
             - success: True if insert succeeded or was duplicate
             - is_duplicate: True if message_id already existed
         """
-        created_at = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
-        
+        if not self._writer_running():
+            raise RuntimeError("storage writer is not running")
+        row = (message_id, from_msisdn, to_msisdn, ts, text, utc_iso())
+        future = asyncio.get_running_loop().create_future()
+        await self._insert_queue.put((row, future))
+        return await future
+    
+    def _writer_running(self) -> bool:
+        """True while the background writer task is alive."""
+        return self._writer_task is not None and not self._writer_task.done()
+    
+    async def _writer_loop(self):
+        """Commit queued inserts, one transaction per batch."""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute(
-                    """
-                    INSERT INTO messages (message_id, from_msisdn, to_msisdn, ts, text, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                    """,
-                    (message_id, from_msisdn, to_msisdn, ts, text, created_at)
-                )
-                await db.commit()
-                return (True, False)
-        except aiosqlite.IntegrityError:
-            # Primary key violation - duplicate message_id
-            return (True, True)
+            stopping = False
+            while not stopping:
+                # Wait for one insert, then take whatever else queued up meanwhile
+                batch = [await self._insert_queue.get()]
+                while len(batch) < MAX_INSERT_BATCH and not self._insert_queue.empty():
+                    batch.append(self._insert_queue.get_nowait())
+                
+                if None in batch:
+                    stopping = True
+                    batch = [item for item in batch if item is not None]
+                if batch:
+                    try:
+                        await self._write_batch(batch)
+                    except Exception:
+                        # The batch's futures already carry the error; keep serving
+                        logger.exception("Insert batch failed")
+        finally:
+            # If the writer dies, nothing queued behind it would ever be resolved
+            error = RuntimeError("storage writer stopped")
+            while not self._insert_queue.empty():
+                item = self._insert_queue.get_nowait()
+                if item is not None:
+                    _fail_futures([item], error)
+    
+    async def _write_batch(self, batch: List[tuple]):
+        """Insert a batch of rows in one transaction and resolve their futures."""
+        results = []
+        try:
+            async with self._lock:
+                try:
+                    for row, _ in batch:
+                        # A duplicate message_id is ignored and returns no row
+                        cursor = await self._db.execute(
+                            """
+                            INSERT OR IGNORE INTO messages (message_id, from_msisdn, to_msisdn, ts, text, created_at)
+                            VALUES (?, ?, ?, ?, ?, ?)
+                            RETURNING message_id
+                            """,
+                            row
+                        )
+                        is_duplicate = await cursor.fetchone() is None
+                        results.append((True, is_duplicate))
+                    await self._db.commit()
+                except BaseException:
+                    try:
+                        await self._db.rollback()
+                    except Exception:
+                        logger.exception("Rollback of insert batch failed")
+                    raise
+        except BaseException as e:
+            # Cancellation and other non-Exception errors still fail the callers
+            _fail_futures(
+                batch,
+                e if isinstance(e, Exception) else RuntimeError("storage writer stopped")
+            )
+            raise
+        
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
     
     async def get_messages(
         self,
@@ -83,13 +276,19 @@ class Storage:
         offset: int = 0,
         from_filter: Optional[str] = None,
         since: Optional[str] = None,
-        q: Optional[str] = None
-    ) -> Tuple[List[dict], int]:
+        q: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        include_total: bool = True
+    ) -> Tuple[List[dict], Optional[int]]:
         """
         Get paginated and filtered messages.
         
+        `after` is a (ts, message_id) keyset position: only rows sorting after
+        it are returned, which avoids scanning skipped rows as OFFSET does.
+        
         Returns:
-            (messages, total_count) tuple
+            (messages, total_count) tuple; total_count is None unless
+            include_total is set
         """
         # Build WHERE clause
         where_clauses = []
@@ -103,33 +302,51 @@ class Storage:
             where_clauses.append("ts >= ?")
             params.append(since)
         
-        if q:
-            where_clauses.append("text LIKE ?")
-            params.append(f"%{q}%")
+        if q and len(q) >= 3:
+            # Trigram index needs at least 3 characters; quote q as a phrase
+            where_clauses.append(
+                "message_id IN (SELECT message_id FROM messages_fts WHERE messages_fts MATCH ?)"
+            )
+            params.append('"' + q.replace('"', '""') + '"')
+        elif q:
+            # Literal substring like the FTS path (LIKE wildcards escaped).
+            # Native LIKE folds ASCII case only; the trigram index folds Unicode.
+            where_clauses.append("text LIKE ? ESCAPE '\\'")
+            escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.append(f"%{escaped}%")
         
         where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
         
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        # Keyset position applies to the page only, not to the total
+        page_where_sql = where_sql
+        page_params = list(params)
+        if after:
+            page_where_sql += " AND (ts, message_id) > (?, ?)"
+            page_params.extend(after)
+        
+        async with self._lock:
+            db = self._db
             
             # Get total count
-            count_cursor = await db.execute(
-                f"SELECT COUNT(*) as count FROM messages WHERE {where_sql}",
-                params
-            )
-            count_row = await count_cursor.fetchone()
-            total = count_row["count"]
+            total = None
+            if include_total:
+                count_cursor = await db.execute(
+                    f"SELECT COUNT(*) as count FROM messages WHERE {where_sql}",
+                    params
+                )
+                count_row = await count_cursor.fetchone()
+                total = count_row["count"]
             
             # Get paginated data
             data_cursor = await db.execute(
                 f"""
                 SELECT message_id, from_msisdn, to_msisdn, ts, text
                 FROM messages
-                WHERE {where_sql}
+                WHERE {page_where_sql}
                 ORDER BY ts ASC, message_id ASC
                 LIMIT ? OFFSET ?
                 """,
-                params + [limit, offset]
+                page_params + [limit, offset]
             )
             rows = await data_cursor.fetchall()
             
@@ -147,9 +364,13 @@ class Storage:
             return (messages, total)
     
     async def get_stats(self) -> dict:
-        """Get message statistics."""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        """Get message statistics, cached for STATS_CACHE_TTL_SECONDS."""
+        return await self._stats_cache.get(self._query_stats)
+    
+    async def _query_stats(self) -> dict:
+        """Compute message statistics from the database."""
+        async with self._lock:
+            db = self._db
             
             # Total messages
             cursor = await db.execute("SELECT COUNT(*) as count FROM messages")
@@ -181,7 +402,11 @@ class Storage:
             
             # First and last message timestamps
             cursor = await db.execute(
-                "SELECT MIN(ts) as first_ts, MAX(ts) as last_ts FROM messages"
+                """
+                SELECT
+                    (SELECT MIN(ts) FROM messages) as first_ts,
+                    (SELECT MAX(ts) FROM messages) as last_ts
+                """
             )
             row = await cursor.fetchone()
             first_message_ts = row["first_ts"]
@@ -0,0 +1,74 @@
+"""Shared helpers for signing and posting test webhooks."""
+import binascii
+import functools
+import hashlib
+import hmac
+import orjson
+from typing import Iterable, Optional, Tuple, Union
+from httpx import AsyncClient, Response
+from app.config import config
+
+
+# Keyed HMAC state built once; copying it skips re-deriving the ipad/opad
+# blocks from the secret for every signature
+_HMAC_PROTO = hmac.new(config.WEBHOOK_SECRET.encode(), b"", hashlib.sha256)
+
+# Headers shared by every webhook POST; only X-Signature varies
+_BASE_HEADERS = {"Content-Type": "application/json"}
+
+
+def compute_signature(body: bytes) -> bytes:
+    """
+    Compute HMAC-SHA256 signature with the configured webhook secret.
+    
+    Returned as ASCII hex bytes, which httpx sends as the header value
+    without building an intermediate str.
+    """
+    h = _HMAC_PROTO.copy()
+    h.update(body)
+    return binascii.hexlify(h.digest())
+
+
+def load_json(response: Response):
+    """Parse a response body with orjson (httpx's .json() uses stdlib json)."""
+    return orjson.loads(response.content)
+
+
+def signed_headers(signature: Union[str, bytes]) -> dict:
+    """Request headers for a webhook POST with the given signature."""
+    return _BASE_HEADERS | {"X-Signature": signature}
+
+
+def _message(message_id: str, from_: str, ts: str, text: str = None) -> dict:
+    """Build a webhook payload dict for a test message."""
+    return {
+        "message_id": message_id,
+        "from": from_,
+        "to": "+14155550100",
+        "ts": ts,
+        "text": text
+    }
+
+
+@functools.lru_cache(maxsize=512)
+def signed_payload(message_id: str, from_: str, ts: str, text: str = None):
+    """Serialize and sign a test message once per distinct payload."""
+    body = orjson.dumps(_message(message_id, from_, ts, text))
+    return body, compute_signature(body)
+
+
+async def insert_test_message(client: AsyncClient, message_id: str, from_: str, ts: str, text: str = None):
+    """Helper to insert a test message."""
+    body, signature = signed_payload(message_id, from_, ts, text)
+    
+    await client.post("/webhook", content=body, headers=signed_headers(signature))
+
+
+async def insert_test_messages(client: AsyncClient, rows: Iterable[Tuple[str, str, str, Optional[str]]]):
+    """Insert (message_id, from, ts, text) rows with one signed /webhook/batch call."""
+    body = orjson.dumps([_message(*row) for row in rows])
+    
+    response = await client.post(
+        "/webhook/batch", content=body, headers=signed_headers(compute_signature(body))
+    )
+    assert response.status_code == 200, response.text
@@ -2,35 +2,56 @@
 import pytest
 import os
 import asyncio
-from app.storage import Storage
-from app.config import config
+from httpx import ASGITransport, AsyncClient
+
+try:
+    import uvloop
+except ImportError:  # uvloop is not available on Windows
+    uvloop = None
+
+# Use in-memory database for tests; must be set before the app is imported.
+# Always overridden so a DATABASE_URL from the shell never points tests at real data.
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+os.environ.setdefault("WEBHOOK_SECRET", "test_secret_key")
+# Seeding helpers post to /webhook/batch, which is only registered when enabled
+os.environ["ENABLE_BATCH_WEBHOOK"] = "true"
+
+from app.main import app, storage
+
+# Transport wrapping the app, built once. It never runs the app lifespan;
+# app_lifespan drives that explicitly.
+_TRANSPORT = ASGITransport(app=app)
 
 
 @pytest.fixture(scope="session")
 def event_loop():
-    """Create an instance of the default event loop for the test session."""
-    loop = asyncio.get_event_loop_policy().new_event_loop()
+    """Create the session event loop, on uvloop when it is installed."""
+    if uvloop is not None:
+        loop = uvloop.new_event_loop()
+    else:
+        loop = asyncio.get_event_loop_policy().new_event_loop()
     yield loop
     loop.close()
 
 
+@pytest.fixture(scope="session")
+async def client():
+    """HTTP client shared by all tests in the session."""
+    async with AsyncClient(transport=_TRANSPORT, base_url="http://test") as c:
+        yield c
+
+
+@pytest.fixture(scope="session", autouse=True)
+async def app_lifespan():
+    """Run app startup once for the session and shutdown at the end."""
+    async with app.router.lifespan_context(app):
+        yield
+
+
 @pytest.fixture(scope="function", autouse=True)
-async def setup_test_db():
-    """Setup test database before each test."""
-    # Use in-memory database for tests
-    test_db_path = ":memory:"
-    original_db_url = config.DATABASE_URL
-    config.DATABASE_URL = f"sqlite:///{test_db_path}"
-    
-    # Ensure WEBHOOK_SECRET is set for tests
-    if not config.WEBHOOK_SECRET:
-        config.WEBHOOK_SECRET = "test_secret_key"
-    
-    # Initialize storage
-    storage = Storage(config.DATABASE_URL)
+async def setup_test_db(app_lifespan):
+    """Give each test a fresh, empty in-memory database."""
+    await storage.close()
+    await storage.connect()
     await storage.init_db()
-    
     yield
-    
-    # Restore original config
-    config.DATABASE_URL = original_db_url
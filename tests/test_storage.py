@@ -0,0 +1,81 @@
+"""Tests for the storage write path."""
+import pytest
+import asyncio
+import sqlite3
+from app.main import storage
+from tests._helpers import insert_test_messages, load_json
+
+
+async def _insert(message_id: str):
+    """Insert a message directly through storage, failing instead of hanging."""
+    return await asyncio.wait_for(
+        storage.insert_message(message_id, "+911111111111", "+14155550100", "2025-01-15T10:00:00Z", "Hi"),
+        timeout=5
+    )
+
+
+@pytest.mark.asyncio
+async def test_insert_batch_failure_does_not_hang(client, monkeypatch):
+    """A failing batch errors its callers and the writer keeps serving."""
+    async def fail(*args, **kwargs):
+        raise sqlite3.OperationalError("disk I/O error")
+    
+    monkeypatch.setattr(storage._db, "execute", fail)
+    monkeypatch.setattr(storage._db, "rollback", fail)
+    
+    with pytest.raises(sqlite3.OperationalError):
+        await _insert("fail1")
+    with pytest.raises(sqlite3.OperationalError):
+        await _insert("fail2")
+    
+    monkeypatch.undo()
+    assert await _insert("ok1") == (True, False)
+    response = await client.get("/health/ready")
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_insert_fails_fast_when_writer_stopped(client):
+    """Inserts are rejected and readiness fails once the writer is gone."""
+    storage._writer_task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await storage._writer_task
+    
+    with pytest.raises(RuntimeError):
+        await _insert("dead1")
+    
+    response = await client.get("/health/ready")
+    assert response.status_code == 503
+    assert load_json(response)["reason"] == "database not ready"
+
+
+@pytest.mark.asyncio
+async def test_fts_index_rebuilt_from_rowid_schema(client):
+    """init_db replaces a rowid-keyed search index and backfills it by message_id."""
+    await insert_test_messages(client, [
+        ("fts1", "+911111111111", "2025-01-15T10:00:00Z", "Hello World"),
+        ("fts2", "+911111111111", "2025-01-15T10:01:00Z", "Goodbye")
+    ])
+    
+    # Recreate the earlier external-content index keyed on rowid
+    db = storage._db
+    for trigger in ("messages_fts_ai", "messages_fts_ad", "messages_fts_au"):
+        await db.execute(f"DROP TRIGGER {trigger}")
+    await db.execute("DROP TABLE messages_fts")
+    await db.execute(
+        "CREATE VIRTUAL TABLE messages_fts USING fts5("
+        "text, content='messages', content_rowid='rowid', tokenize='trigram')"
+    )
+    await db.commit()
+    
+    await storage.init_db()
+    
+    response = await client.get("/messages?q=hello")
+    assert [m["message_id"] for m in load_json(response)["data"]] == ["fts1"]
+    
+    # Triggers on the new index pick up later inserts
+    await insert_test_messages(client, [
+        ("fts3", "+911111111111", "2025-01-15T10:02:00Z", "hello again")
+    ])
+    response = await client.get("/messages?q=hello")
+    assert [m["message_id"] for m in load_json(response)["data"]] == ["fts1", "fts3"]
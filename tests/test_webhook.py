@@ -1,190 +1,164 @@
 """Tests for webhook endpoint."""
 import pytest
-import hmac
-import hashlib
-import json
-from httpx import AsyncClient
-from app.main import app
-from app.config import config
+import orjson
+from types import SimpleNamespace
+from tests._helpers import compute_signature, signed_headers, signed_payload, load_json
 
 
-@pytest.fixture
+# One character over the 4096 text limit
+_LONG_TEXT = "x" * 4097
+
+# Signed (body, signature) pairs that must fail payload validation. The
+# signature is valid so the request gets past the 401 check, which runs first.
+_INVALID_E164 = signed_payload("m2", "invalid", "2025-01-15T10:00:00Z", "Test")
+_INVALID_TS = signed_payload("m3", "+919876543210", "2025-01-15T10:00:00", "Test")  # Missing Z
+_TEXT_TOO_LONG = signed_payload("m4", "+919876543210", "2025-01-15T10:00:00Z", _LONG_TEXT)
+
+
+@pytest.fixture(scope="module")
 def webhook_payload():
-    """Sample webhook payload."""
-    return {
+    """Sample webhook payload with its serialized body and signature."""
+    payload = {
         "message_id": "m1",
         "from": "+919876543210",
         "to": "+14155550100",
         "ts": "2025-01-15T10:00:00Z",
         "text": "Hello"
     }
-
-
-def compute_signature(body: bytes, secret: str) -> str:
-    """Compute HMAC-SHA256 signature."""
-    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    body = orjson.dumps(payload)
+    return SimpleNamespace(payload=payload, body=body, signature=compute_signature(body))
 
 
 @pytest.mark.asyncio
-async def test_webhook_valid_signature(webhook_payload):
+async def test_webhook_valid_signature(client, webhook_payload):
     """Test webhook with valid signature."""
-    body = json.dumps(webhook_payload).encode()
-    signature = compute_signature(body, config.WEBHOOK_SECRET)
-    
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.post(
-            "/webhook",
-            content=body,
-            headers={
-                "Content-Type": "application/json",
-                "X-Signature": signature
-            }
-        )
+    response = await client.post(
+        "/webhook",
+        content=webhook_payload.body,
+        headers=signed_headers(webhook_payload.signature)
+    )
     
     assert response.status_code == 200
-    assert response.json() == {"status": "ok"}
+    assert load_json(response) == {"status": "ok"}
 
 
 @pytest.mark.asyncio
-async def test_webhook_invalid_signature(webhook_payload):
+async def test_webhook_invalid_signature(client, webhook_payload):
     """Test webhook with invalid signature."""
-    body = json.dumps(webhook_payload).encode()
-    
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.post(
-            "/webhook",
-            content=body,
-            headers={
-                "Content-Type": "application/json",
-                "X-Signature": "invalid"
-            }
-        )
+    response = await client.post(
+        "/webhook",
+        content=webhook_payload.body,
+        headers=signed_headers("invalid")
+    )
     
     assert response.status_code == 401
-    assert response.json() == {"detail": "invalid signature"}
+    assert load_json(response) == {"detail": "invalid signature"}
 
 
 @pytest.mark.asyncio
-async def test_webhook_missing_signature(webhook_payload):
+async def test_webhook_missing_signature(client, webhook_payload):
     """Test webhook with missing signature."""
-    body = json.dumps(webhook_payload).encode()
-    
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.post(
-            "/webhook",
-            content=body,
-            headers={"Content-Type": "application/json"}
-        )
+    response = await client.post(
+        "/webhook",
+        content=webhook_payload.body,
+        headers={"Content-Type": "application/json"}
+    )
     
     assert response.status_code == 401
 
 
 @pytest.mark.asyncio
-async def test_webhook_idempotency(webhook_payload):
+async def test_webhook_idempotency(client, webhook_payload):
     """Test webhook idempotency - duplicate message_id."""
-    body = json.dumps(webhook_payload).encode()
-    signature = compute_signature(body, config.WEBHOOK_SECRET)
+    body = webhook_payload.body
+    signature = webhook_payload.signature
+    
+    # First request
+    response1 = await client.post(
+        "/webhook",
+        content=body,
+        headers=signed_headers(signature)
+    )
     
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        # First request
-        response1 = await client.post(
-            "/webhook",
-            content=body,
-            headers={
-                "Content-Type": "application/json",
-                "X-Signature": signature
-            }
-        )
-        
-        # Second request with same message_id
-        response2 = await client.post(
-            "/webhook",
-            content=body,
-            headers={
-                "Content-Type": "application/json",
-                "X-Signature": signature
-            }
-        )
+    # Second request with same message_id
+    response2 = await client.post(
+        "/webhook",
+        content=body,
+        headers=signed_headers(signature)
+    )
     
     assert response1.status_code == 200
     assert response2.status_code == 200
-    assert response1.json() == {"status": "ok"}
-    assert response2.json() == {"status": "ok"}
+    assert load_json(response1) == {"status": "ok"}
+    assert load_json(response2) == {"status": "ok"}
 
 
 @pytest.mark.asyncio
-async def test_webhook_invalid_e164():
+async def test_webhook_invalid_e164(client):
     """Test webhook with invalid E.164 format."""
-    payload = {
-        "message_id": "m2",
-        "from": "invalid",
-        "to": "+14155550100",
-        "ts": "2025-01-15T10:00:00Z",
-        "text": "Test"
-    }
-    body = json.dumps(payload).encode()
-    signature = compute_signature(body, config.WEBHOOK_SECRET)
+    body, signature = _INVALID_E164
     
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.post(
-            "/webhook",
-            content=body,
-            headers={
-                "Content-Type": "application/json",
-                "X-Signature": signature
-            }
-        )
+    response = await client.post(
+        "/webhook",
+        content=body,
+        headers=signed_headers(signature)
+    )
     
     assert response.status_code == 422
 
 
 @pytest.mark.asyncio
-async def test_webhook_invalid_timestamp():
+async def test_webhook_invalid_timestamp(client):
     """Test webhook with invalid timestamp format."""
-    payload = {
-        "message_id": "m3",
-        "from": "+919876543210",
-        "to": "+14155550100",
-        "ts": "2025-01-15T10:00:00",  # Missing Z
-        "text": "Test"
-    }
-    body = json.dumps(payload).encode()
-    signature = compute_signature(body, config.WEBHOOK_SECRET)
+    body, signature = _INVALID_TS
     
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.post(
-            "/webhook",
-            content=body,
-            headers={
-                "Content-Type": "application/json",
-                "X-Signature": signature
-            }
-        )
+    response = await client.post(
+        "/webhook",
+        content=body,
+        headers=signed_headers(signature)
+    )
     
     assert response.status_code == 422
 
 
 @pytest.mark.asyncio
-async def test_webhook_text_too_long():
+async def test_webhook_text_too_long(client):
     """Test webhook with text exceeding max length."""
-    payload = {
-        "message_id": "m4",
-        "from": "+919876543210",
-        "to": "+14155550100",
-        "ts": "2025-01-15T10:00:00Z",
-        "text": "x" * 4097  # Exceeds 4096 limit
-    }
-    body = json.dumps(payload).encode()
-    signature = compute_signature(body, config.WEBHOOK_SECRET)
+    body, signature = _TEXT_TOO_LONG
+    
+    response = await client.post(
+        "/webhook",
+        content=body,
+        headers=signed_headers(signature)
+    )
+    
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_webhook_batch(client, webhook_payload):
+    """Test batch webhook inserts all items and validates the whole list."""
+    payload = webhook_payload.payload
+    second = {**payload, "message_id": "m5"}
+    body = orjson.dumps([payload, second, payload])
+    
+    response = await client.post(
+        "/webhook/batch",
+        content=body,
+        headers=signed_headers(compute_signature(body))
+    )
+    assert response.status_code == 200
+    assert load_json(response) == {"status": "ok"}
     
-    async with AsyncClient(app=app, base_url="http://test") as client:
-        response = await client.post(
-            "/webhook",
-            content=body,
-            headers={
-                "Content-Type": "application/json",
-                "X-Signature": signature
-            }
-        )
+    response = await client.get("/messages")
+    assert [m["message_id"] for m in load_json(response)["data"]] == ["m1", "m5"]
     
+    # One invalid item rejects the whole batch
+    body = orjson.dumps([payload, {**payload, "from": "invalid"}])
+    response = await client.post(
+        "/webhook/batch",
+        content=body,
+        headers=signed_headers(compute_signature(body))
+    )
     assert response.status_code == 422
+    assert load_json(response)["detail"][0]["loc"] == ["body", 1, "from"]